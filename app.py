@@ -6,17 +6,15 @@
 # ==============================================================
 
 import streamlit as st
+import functools
+import io
 import os
 import json
 from datetime import datetime
-from PIL import Image
 import time
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-import qrcode
+
+# reportlab, qrcode and PIL are imported lazily where they are used – they
+# add ~200ms-1s to cold start and are not needed to render the first page
 
 # Import your existing classes (assuming they're in the same file or imported)
 # from your_module import CropDiseaseDetectionSystem, Config
@@ -29,15 +27,60 @@ class Config:
 # ==============================================================
 #  PDF GENERATION FUNCTION
 # ==============================================================
-def generate_pdf_report(res: dict, pdf_path: str):
-    """Generate comprehensive PDF report with all treatment options"""
+# One allocation per treatment instead of repeated f-string concatenation
+_TREATMENT_TMPL = ("<b>{name}</b>{active}<br/>• <b>Dosage:</b> {dosage}"
+                   "<br/>• <b>Apply:</b> {apply}<br/>• <b>Every:</b> {freq}"
+                   "<br/>• <b>Safety:</b> {safety}")
+
+# Styles are immutable – build them once, on the first PDF request
+@functools.lru_cache(maxsize=1)
+def _pdf_styles():
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle("CustomTitle", parent=styles["Title"], fontSize=18, spaceAfter=30, alignment=1,
+                                 textColor=colors.HexColor("#2E8B57"))
+    summary_tbl_style = TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#228B22")),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0,0), (-1,0), 12),
+        ('BOTTOMPADDING', (0,0), (-1,0), 12),
+        ('BACKGROUND', (0,1), (-1,-1), colors.beige),
+        ('GRID', (0,0), (-1,-1), 1, colors.lightgrey)
+    ])
+    return styles, title_style, summary_tbl_style
+
+@functools.lru_cache(maxsize=32)
+def _qr_png_bytes(diagnosis_id: str) -> bytes:
+    """Encode the diagnosis-ID QR code once per ID; repeat report builds reuse it."""
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=4, border=2,
+                       error_correction=qrcode.constants.ERROR_CORRECT_L)
+    qr.add_data(f"Diagnosis ID: {diagnosis_id}")
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def generate_pdf_report(res: dict) -> bytes | None:
+    """Generate comprehensive PDF report with all treatment options, returned as bytes"""
     try:
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter, topMargin=0.8*inch, bottomMargin=0.8*inch)
-        styles = getSampleStyleSheet()
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.units import inch
+        from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, Table,
+                                        Image as RLImage, ListFlowable, ListItem)
+
+        styles, title_style, summary_tbl_style = _pdf_styles()
+        buf = io.BytesIO()
+        doc = SimpleDocTemplate(buf, pagesize=letter, topMargin=0.8*inch, bottomMargin=0.8*inch)
         story = []
 
-        title_style = ParagraphStyle("CustomTitle", parent=styles["Title"], fontSize=18, spaceAfter=30, alignment=1,
-                                     textColor=colors.HexColor("#2E8B57"))
         story.append(Paragraph("CROP DISEASE DIAGNOSIS REPORT", title_style))
         story.append(Spacer(1, 12))
 
@@ -45,44 +88,46 @@ def generate_pdf_report(res: dict, pdf_path: str):
         expl  = res.get("disease_explanation", {})
         summ  = res.get("final_summary", {})
 
+        # Bind every field once up front instead of re-fetching per section
+        disease_name = ident.get("disease_name", "?")
+        crop         = ident.get("crop_type", "?")
+        conf         = ident.get("confidence_score", 0)
+        severity     = ident.get("severity", "?").title()
+        date_human   = res.get("date_human", "?")
+        diagnosis_id = res.get("diagnosis_id", "N/A")
+        simple_summary = expl.get("simple_summary")
+        immediate_action = summ.get("immediate_action_required")
+        prevention_tips  = summ.get("prevention_for_future")
+
         if not ident.get("disease_detected"):
             story.append(Paragraph("<b>RESULT:</b> Healthy Plant", styles["Normal"]))
             story.append(Spacer(1, 12))
             doc.build(story)
-            return True
+            return buf.getvalue()
 
         # Summary Table
         tbl_data = [
-            ["Disease", ident.get("disease_name","?")],
-            ["Crop",    ident.get("crop_type","?")],
-            ["Confidence", f"{ident.get('confidence_score',0)}%"],
-            ["Severity", ident.get("severity","?").title()],
-            ["Date", res.get("date_human","?")]
+            ["Disease", disease_name],
+            ["Crop",    crop],
+            ["Confidence", f"{conf}%"],
+            ["Severity", severity],
+            ["Date", date_human]
         ]
         tbl = Table(tbl_data, colWidths=[2*inch, 3*inch])
-        tbl.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#228B22")),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0,0), (-1,0), 12),
-            ('BOTTOMPADDING', (0,0), (-1,0), 12),
-            ('BACKGROUND', (0,1), (-1,-1), colors.beige),
-            ('GRID', (0,0), (-1,-1), 1, colors.lightgrey)
-        ]))
+        tbl.setStyle(summary_tbl_style)
         story.append(tbl)
         story.append(Spacer(1, 20))
 
         # Simple Summary
-        if expl.get("simple_summary"):
+        if simple_summary:
             story.append(Paragraph("<b>Simple Summary:</b>", styles["Heading3"]))
-            story.append(Paragraph(expl["simple_summary"], styles["Normal"]))
+            story.append(Paragraph(simple_summary, styles["Normal"]))
             story.append(Spacer(1, 12))
 
         # Immediate Action
-        if summ.get("immediate_action_required"):
+        if immediate_action:
             story.append(Paragraph("<b>IMMEDIATE ACTION:</b>", styles["Heading3"]))
-            story.append(Paragraph(summ["immediate_action_required"], styles["Normal"]))
+            story.append(Paragraph(immediate_action, styles["Normal"]))
             story.append(Spacer(1, 12))
 
         # ALL TREATMENT OPTIONS
@@ -93,62 +138,64 @@ def generate_pdf_report(res: dict, pdf_path: str):
             story.append(Paragraph("<b>Recommended Treatment Options:</b>", styles["Heading3"]))
             story.append(Spacer(1, 8))
 
+            bullet_htmls = []
             for t in treatments:
-                name = t.get("product_name", "Unknown Treatment")
-                dosage = t.get("dosage", "See label")
-                apply = t.get("application_method", "Spray")
-                freq = t.get("frequency", "Every 7-10 days")
-                safety = t.get("safety_precautions", "Wear gloves")
                 active = t.get("active_ingredient", "")
-
-                bullet_text = f"<b>{name}</b>"
-                if active:
-                    bullet_text += f" ({active})"
-                bullet_text += f"<br/>• <b>Dosage:</b> {dosage}<br/>• <b>Apply:</b> {apply}<br/>• <b>Every:</b> {freq}<br/>• <b>Safety:</b> {safety}"
-
-                story.append(Paragraph(f"• {bullet_text}", styles["Normal"]))
-                story.append(Spacer(1, 6))
+                bullet_htmls.append(_TREATMENT_TMPL.format_map({
+                    "name": t.get("product_name", "Unknown Treatment"),
+                    "active": f" ({active})" if active else "",
+                    "dosage": t.get("dosage", "See label"),
+                    "apply": t.get("application_method", "Spray"),
+                    "freq": t.get("frequency", "Every 7-10 days"),
+                    "safety": t.get("safety_precautions", "Wear gloves"),
+                }))
+
+            story.append(ListFlowable(
+                [ListItem(Paragraph(html, styles["Normal"])) for html in bullet_htmls],
+                bulletType='bullet'))
             story.append(Spacer(1, 10))
 
         # Step-by-Step
         instr = res.get("treatment_instructions", {})
         if "error" not in instr and instr.get("preparation_steps"):
             story.append(Paragraph("<b>Step-by-Step Application (Recommended):</b>", styles["Heading3"]))
-            for step in instr.get("preparation_steps", []) + instr.get("application_steps", []):
-                t = step.get("title", "")
-                i = step.get("instruction", "")
-                story.append(Paragraph(f"• <b>{t}:</b> {i}", styles["Normal"]))
+            story.append(ListFlowable(
+                [ListItem(Paragraph(f"<b>{step.get('title', '')}:</b> {step.get('instruction', '')}",
+                                    styles["Normal"]))
+                 for step in instr.get("preparation_steps", []) + instr.get("application_steps", [])],
+                bulletType='bullet'))
             story.append(Spacer(1, 8))
 
         # Prevention
-        if summ.get("prevention_for_future"):
+        if prevention_tips:
             story.append(Paragraph("<b>Prevention for Future:</b>", styles["Heading3"]))
-            for tip in summ["prevention_for_future"]:
-                story.append(Paragraph(f"• {tip}", styles["Normal"]))
+            story.append(ListFlowable(
+                [ListItem(Paragraph(tip, styles["Normal"])) for tip in prevention_tips],
+                bulletType='bullet'))
             story.append(Spacer(1, 12))
 
-        # QR Code
-        qr = qrcode.QRCode(version=1, box_size=8, border=2)
-        qr.add_data(f"Diagnosis ID: {res.get('diagnosis_id', 'N/A')}")
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        qr_path = f"qr_{res.get('diagnosis_id', 'temp')}.png"
-        img.save(qr_path)
+        # QR Code (cached per diagnosis ID, kept in memory)
         story.append(Paragraph("<b>Scan for Full Data:</b>", styles["Normal"]))
-        story.append(RLImage(qr_path, width=1.2*inch, height=1.2*inch))
+        story.append(RLImage(io.BytesIO(_qr_png_bytes(diagnosis_id)), width=1.2*inch, height=1.2*inch))
         story.append(Spacer(1, 12))
         story.append(Paragraph("AI Crop Doctor – OpenRouter + Serper", styles["Normal"]))
 
         doc.build(story)
-        
-        # Cleanup QR code
-        if os.path.exists(qr_path):
-            os.remove(qr_path)
-        
-        return True
+        return buf.getvalue()
     except Exception as e:
         st.error(f"PDF Generation Error: {str(e)}")
-        return False
+        return None
+
+@st.cache_data(show_spinner=False, hash_funcs={dict: lambda d: d["diagnosis_id"]})
+def build_pdf_bytes(result: dict) -> bytes | None:
+    """Build the PDF in memory and cache the bytes per diagnosis, so reruns
+    triggered by other widgets don't re-run the ReportLab layout engine."""
+    return generate_pdf_report(result)
+
+@st.cache_data(show_spinner=False, hash_funcs={dict: lambda d: d["diagnosis_id"]})
+def serialize_result_json(result: dict) -> str:
+    """Serialize the result once per diagnosis instead of on every rerun."""
+    return json.dumps(result, indent=2)
 
 # ==============================================================
 #  STREAMLIT PAGE CONFIG
@@ -163,7 +210,9 @@ st.set_page_config(
 # ==============================================================
 #  CUSTOM CSS
 # ==============================================================
-st.markdown("""
+@st.cache_resource
+def _app_css() -> str:
+    return """
     <style>
     .main {
         background: linear-gradient(135deg, #f0fdf4 0%, #dcfce7 100%);
@@ -181,7 +230,9 @@ st.markdown("""
         color: #059669;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_app_css(), unsafe_allow_html=True)
 
 # ==============================================================
 #  SIDEBAR
@@ -258,19 +309,32 @@ with col1:
     )
     
     if uploaded_file is not None:
-        # Save uploaded file temporarily
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-        image_path = os.path.join(temp_dir, uploaded_file.name)
-        
-        with open(image_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        st.session_state.uploaded_image_path = image_path
-        
+        # Decode and downscale only when a new file arrives; reruns reuse the
+        # cached thumbnail instead of re-decoding the upload
+        if st.session_state.get("display_image_name") != uploaded_file.name:
+            from PIL import Image
+
+            # Downscale before display/persistence – phone photos are often 4-12 MP
+            # and the full image would be re-sent to the browser on every rerun
+            raw = io.BytesIO(uploaded_file.getbuffer())
+            image = Image.open(raw)
+            image.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+            del raw  # thumbnail forced the decode; let GC reclaim the raw bytes
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            # Save the downscaled copy for the analysis pipeline
+            temp_dir = "temp_uploads"
+            os.makedirs(temp_dir, exist_ok=True)
+            image_path = os.path.join(temp_dir, os.path.splitext(uploaded_file.name)[0] + ".jpg")
+            image.save(image_path, format="JPEG", quality=85, optimize=True)
+
+            st.session_state.uploaded_image_path = image_path
+            st.session_state.display_image = image
+            st.session_state.display_image_name = uploaded_file.name
+
         # Display image
-        image = Image.open(uploaded_file)
-        st.image(image, caption="Uploaded Image", use_container_width=True)
+        st.image(st.session_state.display_image, caption="Uploaded Image", use_container_width=True)
         
 with col2:
     st.markdown("### 📋 Upload Guidelines")
@@ -310,10 +374,14 @@ if uploaded_file is not None:
                     "📊 Generating comprehensive summary..."
                 ]
                 
+                # The per-stage sleep is demo theater: it blocks the script
+                # thread for 5 s and starves other sessions. Opt in via DEMO_UI.
+                demo_delay = bool(os.environ.get("DEMO_UI"))
                 for i, stage in enumerate(stages):
                     status_text.text(stage)
                     progress_bar.progress((i + 1) * 20)
-                    time.sleep(1)
+                    if demo_delay:
+                        time.sleep(1)
                 
                 # REPLACE THIS SECTION WITH YOUR ACTUAL SYSTEM CALL:
                 # ==================================================
@@ -409,15 +477,20 @@ if uploaded_file is not None:
                 }
                 
                 st.session_state.analysis_result = result
+                st.session_state.balloons_shown = False
                 progress_bar.progress(100)
                 status_text.text("✅ Analysis complete!")
-                time.sleep(0.5)
+                if demo_delay:
+                    time.sleep(0.5)
                 st.rerun()
 
 # ==============================================================
 #  DISPLAY RESULTS
 # ==============================================================
-if st.session_state.analysis_result is not None:
+@st.fragment
+def render_results():
+    """Results section isolated as a fragment – expander clicks and the
+    download buttons rerun only this block, not the whole script."""
     result = st.session_state.analysis_result
     identification = result.get("disease_identification", {})
     explanation = result.get("disease_explanation", {})
@@ -430,7 +503,10 @@ if st.session_state.analysis_result is not None:
     
     if not identification.get("disease_detected"):
         st.success("✅ Good news! Your crop appears to be healthy!")
-        st.balloons()
+        # Celebrate once per analysis, not on every rerun of this block
+        if not st.session_state.get("balloons_shown"):
+            st.balloons()
+            st.session_state.balloons_shown = True
     else:
         # Disease Overview
         st.markdown("### 🦠 Disease Overview")
@@ -448,11 +524,14 @@ if st.session_state.analysis_result is not None:
             severity_colors = {"Mild": "🟢", "Moderate": "🟡", "Severe": "🔴", "None": "⚪"}
             st.metric("Severity", f"{severity_colors.get(severity, '⚪')} {severity}")
         
-        if explanation.get("simple_summary"):
-            st.info(f"📝 **Summary:** {explanation['simple_summary']}")
-        
-        if summary.get("immediate_action_required"):
-            st.error(f"🚨 **IMMEDIATE ACTION REQUIRED:**\n\n{summary['immediate_action_required']}")
+        simple_summary = explanation.get("simple_summary")
+        immediate_action = summary.get("immediate_action_required")
+
+        if simple_summary:
+            st.info(f"📝 **Summary:** {simple_summary}")
+
+        if immediate_action:
+            st.error(f"🚨 **IMMEDIATE ACTION REQUIRED:**\n\n{immediate_action}")
         
         st.markdown("---")
         
@@ -493,16 +572,17 @@ if st.session_state.analysis_result is not None:
         st.markdown("---")
         
         # Step-by-Step Instructions
-        if instructions.get("preparation_steps"):
+        preparation_steps = instructions.get("preparation_steps", [])
+        if preparation_steps:
             st.markdown("### 📋 Step-by-Step Application Guide")
             st.markdown(f"**Recommended:** {instructions.get('selected_treatment', 'See treatments above')}")
             st.markdown(f"**Why:** {instructions.get('why_chosen', 'Most effective option')}")
-            
+
             col1, col2 = st.columns(2)
-            
+
             with col1:
                 st.markdown("#### 🔧 Preparation Steps")
-                for step in instructions.get("preparation_steps", []):
+                for step in preparation_steps:
                     st.markdown(f"**{step.get('step_number')}. {step.get('title')}**")
                     st.markdown(f"   {step.get('instruction')}")
             
@@ -532,23 +612,13 @@ if st.session_state.analysis_result is not None:
         with col1:
             if st.button("📥 Download PDF Report", type="primary", use_container_width=True):
                 with st.spinner("📄 Generating PDF report..."):
-                    # Generate PDF
+                    # Generate PDF (cached per diagnosis, built in memory)
                     pdf_filename = f"report_{result['diagnosis_id']}.pdf"
-                    pdf_path = os.path.join("reports", pdf_filename)
-                    
-                    # Create reports directory if it doesn't exist
-                    os.makedirs("reports", exist_ok=True)
-                    
-                    # Generate the PDF
-                    success = generate_pdf_report(result, pdf_path)
-                    
-                    if success and os.path.exists(pdf_path):
+                    pdf_bytes = build_pdf_bytes(result)
+
+                    if pdf_bytes:
                         st.success("✅ PDF report generated successfully!")
-                        
-                        # Read the PDF file
-                        with open(pdf_path, "rb") as pdf_file:
-                            pdf_bytes = pdf_file.read()
-                        
+
                         # Offer download button
                         st.download_button(
                             label="💾 Click here to download PDF",
@@ -557,14 +627,12 @@ if st.session_state.analysis_result is not None:
                             mime="application/pdf",
                             use_container_width=True
                         )
-                        
-                        st.info(f"📁 PDF also saved at: {pdf_path}")
                     else:
                         st.error("❌ Failed to generate PDF. Check console for errors.")
         
         with col2:
-            # Save JSON
-            json_data = json.dumps(result, indent=2)
+            # Save JSON (cached per diagnosis)
+            json_data = serialize_result_json(result)
             st.download_button(
                 label="📊 Download JSON Data",
                 data=json_data,
@@ -577,7 +645,14 @@ if st.session_state.analysis_result is not None:
             if st.button("🔄 Analyze Another Image", use_container_width=True):
                 st.session_state.analysis_result = None
                 st.session_state.uploaded_image_path = None
-                st.rerun()
+                st.session_state.display_image = None
+                st.session_state.display_image_name = None
+                st.session_state.balloons_shown = False
+                # Resetting state affects the upload section, so leave the fragment
+                st.rerun(scope="app")
+
+if st.session_state.analysis_result is not None:
+    render_results()
 
 # ==============================================================
 #  FOOTER